@@ -0,0 +1,182 @@
+import numpy as np
+from scipy import sparse
+from sklearn.random_projection import SparseRandomProjection
+
+from similarity import inverted_index, rank_neighbours
+
+def sketch_vectors(matrix, dimensions=256, seed=0):
+
+    """
+    Projects the entry vectors onto a few random directions, giving short dense sketches of them.
+
+    Args:
+        matrix (csr_matrix): The L2-normalised (entries x vocabulary) TF-IDF matrix.
+        dimensions (int, optional): The length of each sketch. Defaults to 256.
+        seed (int, optional): Seeds the random projection, so runs are repeatable. Defaults to 0.
+
+    Returns:
+        ndarray: An (entries x dimensions) float32 array of L2-normalised sketches. Entries with an empty
+                 vector get an all-zero sketch.
+
+    Explanation:
+        - A random projection roughly preserves angles, so the dot product of two sketches estimates
+          the cosine similarity of the entries, to within about 1 / sqrt(dimensions).
+    """
+
+    sketches = SparseRandomProjection(
+            n_components=min(dimensions, matrix.shape[1]), dense_output=True, random_state=seed)\
+        .fit_transform(matrix)\
+        .astype(np.float32)
+
+    norms = np.linalg.norm(sketches, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return sketches / norms
+
+def nearest_cells(sketches, centroids, n_probe=1, block_size=4096):
+
+    """
+    Returns the n_probe cells whose centroids are closest to each sketch, as an (entries x n_probe) array.
+    """
+
+    n_probe = min(n_probe, len(centroids))
+    cells = np.empty((len(sketches), n_probe), dtype=np.int64)
+
+    for start in range(0, len(sketches), block_size):
+        similarity = sketches[start:start + block_size] @ centroids.T
+        cells[start:start + block_size] = np.argpartition(-similarity, n_probe - 1, axis=1)[:, :n_probe]
+
+    return cells
+
+def train_cells(sketches, n_cells, iterations=5, seed=0):
+
+    """
+    Splits the sketches into n_cells cells of similar entries with a few rounds of spherical k-means.
+
+    Args:
+        sketches (ndarray): The sketches returned by sketch_vectors.
+        n_cells (int): The number of cells.
+        iterations (int, optional): The number of k-means rounds. Defaults to 5.
+        seed (int, optional): Seeds the choice of starting centroids. Defaults to 0.
+
+    Returns:
+        tuple: (centroids, cells) where centroids is an (n_cells x dimensions) array and cells holds the
+               cell of every sketch.
+    """
+
+    centroids = sketches[np.random.default_rng(seed).choice(len(sketches), n_cells, replace=False)]
+
+    for _ in range(iterations):
+        cells = nearest_cells(sketches, centroids)[:, 0]
+        sums = sparse.csr_matrix(
+            (np.ones(len(cells), dtype=np.float32), (cells, np.arange(len(cells)))),
+            shape=(n_cells, len(cells))) @ sketches
+        norms = np.linalg.norm(sums, axis=1)
+        centroids = np.where(norms[:, None] > 0, sums / np.maximum(norms, 1e-12)[:, None], centroids)
+
+    return centroids.astype(np.float32), nearest_cells(sketches, centroids)[:, 0]
+
+def ann_blocks(tfidf_matrix, dimensions=256, n_probe=8, seed=0, block_size=512, rows=None):
+
+    """
+    Yields the exact cosine similarity of each query row with the members of its nearest cells of a random-projection index.
+
+    Args:
+        tfidf_matrix (csr_matrix): The sparse (entries x vocabulary) TF-IDF matrix.
+        dimensions (int, optional): The sketch length the cells are built from; see sketch_vectors. Defaults to 256.
+        n_probe (int, optional): The number of cells searched per query row. Defaults to 8.
+        seed (int, optional): Seeds the projection and the cells. Defaults to 0.
+        block_size (int, optional): The number of query rows per block. Defaults to 512.
+        rows (ndarray, optional): Positions of the query rows. Defaults to None (every row).
+
+    Yields:
+        tuple: (start, stop, block) as in blocked_similarity, but holding scores only for the pairs searched.
+
+    Explanation:
+        - The non-empty entries are sketched and split into about sqrt(N) cells of similar entries.
+        - Each query row is scored, with its exact cosine similarity, against every member of its n_probe
+          nearest cells only, so a row costs about n_probe * sqrt(N) sparse products instead of N.
+        - The sketches only decide which cells are searched. Every entry in them is scored exactly, so
+          searching every cell gives the exact result.
+    """
+
+    matrix, _ = inverted_index(tfidf_matrix)
+    n = matrix.shape[0]
+    sketches = sketch_vectors(matrix, dimensions, seed)
+
+    indexed = np.flatnonzero(np.diff(matrix.indptr) > 0)
+    n_cells = max(1, min(int(np.sqrt(len(indexed))), len(indexed)))
+    centroids, cells = train_cells(sketches[indexed], n_cells, seed=seed)
+    order = np.argsort(cells, kind='stable')
+    members = np.split(indexed[order], np.cumsum(np.bincount(cells, minlength=n_cells))[:-1])
+    member_vectors = [matrix[cell_members].T.tocsr() for cell_members in members]
+
+    if rows is None:
+        rows = np.arange(n)
+
+    for start in range(0, len(rows), block_size):
+        stop = min(start + block_size, len(rows))
+        query = rows[start:stop]
+
+        probe_rows = probe_cells = np.zeros(0, dtype=np.int64)
+        searched = np.flatnonzero(np.diff(matrix.indptr)[query] > 0)
+        if len(searched) and len(indexed):
+            probes = nearest_cells(sketches[query[searched]], centroids, n_probe)
+            probe_rows = np.repeat(searched, probes.shape[1])
+            probe_cells = probes.ravel()
+
+        pair_rows, pair_columns, pair_scores = [], [], []
+        for cell in np.unique(probe_cells):
+            cell_rows = probe_rows[probe_cells == cell]
+            similarity = (matrix[query[cell_rows]] @ member_vectors[cell]).tocoo()
+            pair_rows.append(cell_rows[similarity.row])
+            pair_columns.append(members[cell][similarity.col])
+            pair_scores.append(similarity.data)
+
+        block = sparse.csr_matrix(
+            (np.concatenate(pair_scores or [np.zeros(0)]).astype(np.float32),
+             (np.concatenate(pair_rows or [np.zeros(0, dtype=np.int64)]),
+              np.concatenate(pair_columns or [np.zeros(0, dtype=np.int64)]))),
+            shape=(stop - start, n))
+        block.eliminate_zeros()
+
+        yield start, stop, block
+
+def ann_neighbours(tfidf_matrix, k=4, quantile=None, block_size=512, rows=None, pin_self=False,
+                   dimensions=256, n_probe=8, seed=0):
+
+    """
+    Approximates topk_neighbours by ranking only the candidates found by a random-projection index.
+
+    Args:
+        tfidf_matrix (csr_matrix): The sparse (entries x vocabulary) TF-IDF matrix.
+        k (int, optional): The number of neighbours kept per entry. Defaults to 4.
+        quantile (float, optional): The per-entry threshold quantile, taken over the searched scores with
+                                    every other entry counted as zero. Defaults to None.
+        block_size (int, optional): The number of rows scored per block. Defaults to 512.
+        rows (ndarray, optional): Positions of the entries to rank. Defaults to None (every entry).
+        pin_self (bool, optional): Whether each entry is pinned first in its own list. Defaults to False.
+        dimensions (int, optional): The sketch length. Longer sketches group similar entries better. Defaults to 256.
+        n_probe (int, optional): The recall/speed knob: the number of cells, of about sqrt(N) entries each,
+                                 scored exactly per entry. More cells are slower and find more of the true
+                                 neighbours; searching all sqrt(N) cells is exact. Defaults to 8.
+        seed (int, optional): Seeds the projection and the cells. Defaults to 0.
+
+    Returns:
+        tuple: (indices, scores) arrays of shape (len(rows), k), as returned by topk_neighbours.
+
+    Explanation:
+        - The scores kept are exact, so the returned lists are ordered exactly as topk_neighbours would
+          order the same entries; the approximation is only in which entries were considered.
+        - The exact work per entry is n_probe / sqrt(N) of the exact path's, so the speed-up shrinks as
+          n_probe grows, and the cells pay off only on corpora of tens of thousands of entries or more.
+        - Rows with fewer than k candidates are padded as in select_topk_sparse, with a score of 0.
+    """
+
+    n = tfidf_matrix.shape[0]
+    n_rows = n if rows is None else len(rows)
+    k = min(k, n)
+    rows = np.arange(n) if rows is None else np.asarray(rows)
+
+    return rank_neighbours(ann_blocks(tfidf_matrix, dimensions, n_probe, seed, block_size, rows), n, n_rows, k,
+                           quantile, rows if pin_self else None)
@@ -0,0 +1,233 @@
+import argparse
+import json
+import numpy as np
+import os
+import polars as pl
+import shutil
+import subprocess
+import sys
+
+from corpus import column_names, unwanted_match_words
+
+syllables = ["ba", "ro", "ki", "mel", "dan", "tor", "vin", "sa", "lu", "pe", "gor", "win", "ash", "el", "har", "mo",
+             "ny", "th", "bri", "ham", "wil", "ford", "wood", "ruff", "phe", "be", "nau", "voo"]
+
+weekdays = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+months = sorted(unwanted_match_words - set(weekdays))
+
+def zipf_weights(n, exponent):
+
+    """
+    Returns the probabilities of n ranked items under Zipf's law, p(rank) proportional to 1 / rank^exponent.
+    """
+
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def make_words(rng, n, parts=(2, 3)):
+
+    """
+    Makes n distinct made-up words by stringing parts[0] to parts[1] syllables together, in random order.
+    """
+
+    if n > sum(len(syllables) ** length for length in range(parts[0], parts[1] + 1)):
+        raise ValueError(f"{len(syllables)} syllables cannot make {n} distinct words of {parts[0]}-{parts[1]} syllables")
+
+    words = set()
+    while len(words) < n:
+        length = rng.integers(parts[0], parts[1] + 1)
+        words.add("".join(rng.choice(syllables, size=length)))
+
+    return list(rng.permutation(sorted(words)))
+
+def synthetic_tags(rng, n, pool, exponent=1.1, max_tags=6, tagless=0.2):
+
+    """
+    Draws n tag fields in the export's '[[Tag A]]|[[Tag B]]' format.
+
+    Args:
+        rng (Generator): The random generator.
+        n (int): The number of fields.
+        pool (list): The distinct tags, most frequent first.
+        exponent (float, optional): The Zipf exponent of the tag frequencies. Defaults to 1.1, so a few tags
+                                    are on a large share of the entries and most are rare.
+        max_tags (int, optional): The most tags per entry. Defaults to 6.
+        tagless (float, optional): The share of entries left without tags. Defaults to 0.2.
+
+    Returns:
+        list: The n tag fields, an empty string for each tagless entry.
+    """
+
+    counts = np.where(rng.random(n) < tagless, 0, rng.integers(1, max_tags + 1, size=n))
+    drawn = rng.choice(len(pool), size=counts.sum(), p=zipf_weights(len(pool), exponent))
+    bounds = np.append(0, np.cumsum(counts))
+
+    return ["|".join(f"[[{pool[tag]}]]" for tag in dict.fromkeys(drawn[bounds[row]:bounds[row + 1]]))
+            for row in range(n)]
+
+def synthetic_corpus(n, data_path, seed=0, vocabulary=50000, words_per_entry=(20, 300), n_people=5000,
+                     n_places=2000, n_topics=500):
+
+    """
+    Writes a synthetic derived_data.csv with the same 17 columns as the real export.
+
+    Args:
+        n (int): The number of journal entries.
+        data_path (str): The CSV file written.
+        seed (int, optional): Seeds the generator, so the same n always gives the same corpus. Defaults to 0.
+        vocabulary (int, optional): The number of distinct transcript words. Defaults to 50000.
+        words_per_entry (tuple, optional): The range of transcript lengths, in words. Defaults to (20, 300).
+        n_people (int, optional): The number of distinct people tags. Defaults to 5000.
+        n_places (int, optional): The number of distinct places tags. Defaults to 2000.
+        n_topics (int, optional): The number of distinct topics tags. Defaults to 500.
+
+    Explanation:
+        - Transcript words follow Zipf's law, as natural text does, so the number of distinct words seen
+          keeps growing with n. Each transcript opens with a weekday and month and contains escaped line
+          breaks, like the journal pages.
+        - People, places and topics tags are drawn with a Zipf skew, and about one entry in five has no tags
+          for a facet, so the transcript fallback is exercised.
+    """
+
+    rng = np.random.default_rng(seed)
+    words = np.array(make_words(rng, vocabulary, parts=(2, 4)))
+    people = [f"{first.title()} {last.title()}" for first, last in
+              zip(make_words(rng, n_people), make_words(rng, n_people))]
+    places = [place.title() for place in make_words(rng, n_places, parts=(2, 4))]
+    topics = [topic.title() for topic in make_words(rng, n_topics, parts=(3, 4))]
+
+    lengths = rng.integers(words_per_entry[0], words_per_entry[1] + 1, size=n)
+    drawn = words[rng.choice(vocabulary, size=lengths.sum(), p=zipf_weights(vocabulary, 1.0))]
+    bounds = np.append(0, np.cumsum(lengths))
+    transcripts = [
+        f"{rng.choice(weekdays)} {rng.choice(months)} {rng.integers(1, 29)}\\n" + " ".join(drawn[start:stop])
+        for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    ids = np.arange(1, n + 1)
+    pl.DataFrame({
+        'Internal ID': ids,
+        'Document Type': ["Journals"] * n,
+        'Parent ID': ids // 100 + 1,
+        'Order': ids % 100,
+        'Parent Name': [f"Journal {parent}" for parent in ids // 100 + 1],
+        'UUID': [f"{seed:08x}-0000-4000-8000-{row:012x}" for row in ids],
+        'Name': [f"Page {row}" for row in ids],
+        'Website URL': [f"https://example.org/p/{row}" for row in ids],
+        'Short URL': [f"https://example.org/s/{row}" for row in ids],
+        'Image URL': [f"https://example.org/i/{row}.jpg" for row in ids],
+        'Original Transcript': transcripts,
+        'Text Only Transcript': transcripts,
+        'People': synthetic_tags(rng, n, people),
+        'Places': synthetic_tags(rng, n, places),
+        'First Date': ["1838-03-04"] * n,
+        'Dates': ["1838-03-04"] * n,
+        'Topics': synthetic_tags(rng, n, topics)})\
+        .select(list(column_names))\
+        .write_csv(data_path)
+
+def scaling_exponents(runs):
+
+    """
+    Estimates how each stage's wall time grows with the corpus size.
+
+    Args:
+        runs (list): The run reports written by pipeline.run, smallest corpus first.
+
+    Returns:
+        dict: Stage name -> the exponent b of time ~ N^b between each pair of consecutive sizes. An
+              exponent near 1 is linear; one near 2 is an N^2 stage.
+    """
+
+    timings = [{record["stage"]: record["wall_seconds"] for record in run["stages"] if not record.get("skipped")}
+               for run in runs]
+    exponents = {}
+    for previous, current, small, large in zip(runs, runs[1:], timings, timings[1:]):
+        for stage in small.keys() & large.keys():
+            if small[stage] > 0 and large[stage] > 0:
+                exponents.setdefault(stage, []).append(round(
+                    float(np.log(large[stage] / small[stage]) / np.log(current["entries"] / previous["entries"])), 2))
+
+    return exponents
+
+def run_benchmark(sizes, bench_dir, options=(), seed=0):
+
+    """
+    Runs the pipeline on a synthetic corpus of each size and collects the run reports into one scaling report.
+
+    Args:
+        sizes (list): The corpus sizes, e.g. [1000, 10000, 50000, 200000].
+        bench_dir (str): The folder the corpora, outputs and reports are written to, one subfolder per size.
+        options (list, optional): Extra pipeline.py arguments, e.g. ['--workers', '4']. Defaults to none.
+        seed (int, optional): Seeds the synthetic corpora. Defaults to 0.
+
+    Returns:
+        dict: The settings, every size's run report and the scaling exponents of each stage.
+
+    Explanation:
+        - Every size runs in its own process with --force and empty caches, so the peak memory of one
+          size does not carry over into the next and every stage is measured cold.
+        - A corpus that was already generated for a size and seed is reused.
+    """
+
+    runs = []
+    for n in sorted(sizes):
+        size_dir = os.path.join(bench_dir, str(n))
+        data_path = os.path.join(size_dir, f"derived_data_{seed}.csv")
+        os.makedirs(size_dir, exist_ok=True)
+        if not os.path.exists(data_path):
+            print(f"Generating {n} entries")
+            synthetic_corpus(n, data_path, seed=seed)
+
+        output_dir = os.path.join(size_dir, "output")
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+        print(f"Running {n} entries")
+        report_path = os.path.join(size_dir, "run_report.json")
+        subprocess.run(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline.py"),
+             "--data", data_path, "--output-dir", output_dir, "--report", report_path, "--force", *options],
+            check=True, stdout=subprocess.DEVNULL)
+        with open(report_path) as report_file:
+            runs.append(json.load(report_file))
+
+    return {"seed": seed, "options": list(options), "runs": runs, "scaling_exponents": scaling_exponents(runs)}
+
+def print_summary(benchmark):
+
+    """
+    Prints each stage's wall time and the peak memory for every size, and its scaling exponents.
+    """
+
+    runs = benchmark["runs"]
+    stages = list(dict.fromkeys(
+        record["stage"] for run in runs for record in run["stages"] if not record.get("skipped")))
+
+    print(f"{'stage':<16}" + "".join(f"{run['entries']:>12}" for run in runs) + "   exponents")
+    for stage in stages:
+        times = [next((record["wall_seconds"] for record in run["stages"] if record["stage"] == stage), None)
+                 for run in runs]
+        print(f"{stage:<16}" + "".join(f"{'-' if time is None else f'{time:.2f}s':>12}" for time in times) +
+              f"   {benchmark['scaling_exponents'].get(stage, [])}")
+    print(f"{'peak rss':<16}" + "".join(f"{run['peak_rss_mb']:>10.0f}MB" for run in runs))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Generates synthetic corpora of several sizes and records how each pipeline stage scales. "
+                    "Unrecognised arguments (e.g. --workers 4 or --hashing) are passed on to pipeline.py.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 200000],
+                        help="the corpus sizes to run (default: 1000 10000 50000 200000)")
+    parser.add_argument("--bench-dir", default="benchmark_runs",
+                        help="the folder the corpora and reports are written to (default: ./benchmark_runs)")
+    parser.add_argument("--seed", type=int, default=0, help="seeds the synthetic corpora (default: 0)")
+    parser.add_argument("--generate", metavar="PATH", default=None,
+                        help="only write a synthetic corpus of the first size to PATH, e.g. to try the app")
+    args, options = parser.parse_known_args()
+
+    if args.generate is not None:
+        synthetic_corpus(args.sizes[0], args.generate, seed=args.seed)
+    else:
+        benchmark = run_benchmark(args.sizes, args.bench_dir, options, args.seed)
+        with open(os.path.join(args.bench_dir, "benchmark.json"), "w") as benchmark_file:
+            json.dump(benchmark, benchmark_file, indent=2)
+        print_summary(benchmark)
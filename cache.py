@@ -0,0 +1,108 @@
+import hashlib
+import json
+import numpy as np
+import os
+import sklearn
+from scipy import sparse
+
+def column_key(data, kind, **params):
+
+    """
+    Fingerprints a column of text together with the settings it is vectorized with.
+
+    Args:
+        data (Series): The cleaned column, one journal entry per row.
+        kind (str): The kind of matrix built from it, e.g. 'tfidf' or 'tags'.
+        **params: The vectorizer parameters. Any change to them gives a new key.
+
+    Returns:
+        str: The hex SHA-1 of the kind, the parameters, the scikit-learn version and every value of the column.
+    """
+
+    digest = hashlib.sha1(json.dumps([kind, sklearn.__version__, params], sort_keys=True, default=str).encode())
+    for value in data:
+        digest.update(value.encode())
+        digest.update(b"\x1f")
+
+    return digest.hexdigest()
+
+def load_matrix(cache_dir, key):
+
+    """
+    Returns the matrix saved by save_matrix under a key, or None if there is none.
+    """
+
+    matrix_path = os.path.join(cache_dir, f"{key}.npz")
+    if not os.path.exists(matrix_path):
+        return None
+
+    return sparse.load_npz(matrix_path).tocsr()
+
+def replace_file(path, write):
+
+    """
+    Writes a file through write(file) to a temporary name next to it, then swaps it in whole, so an
+    interrupted write never leaves a truncated file at path.
+    """
+
+    with open(f"{path}.tmp", "wb") as temporary_file:
+        write(temporary_file)
+    os.replace(f"{path}.tmp", path)
+
+def save_matrix(cache_dir, key, matrix, vocabulary=None, idf=None, slot=None):
+
+    """
+    Saves a fitted vectorizer's output under a key.
+
+    Args:
+        cache_dir (str): The cache folder. It is created if needed.
+        key (str): The key returned by column_key.
+        matrix (csr_matrix): The vectorized column.
+        vocabulary (dict, optional): The fitted vocabulary, token -> column. Defaults to None.
+        idf (ndarray, optional): The fitted IDF weights. Defaults to None.
+        slot (str, optional): What the matrix is of, e.g. 'tfidf_people'. The files last saved for the same
+                              slot under another key are deleted, so each refresh replaces its matrices rather
+                              than adding to them. Defaults to None (nothing is deleted).
+
+    Explanation:
+        - The files are <key>_vocabulary.json, <key>_idf.npy and <key>.npz. Each is written to a temporary
+          name and renamed into place, and the matrix is written last, so an interrupted save is never
+          mistaken for a cached one.
+        - slots.json records the key each slot was last saved under.
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    if vocabulary is not None:
+        replace_file(os.path.join(cache_dir, f"{key}_vocabulary.json"), lambda vocabulary_file: vocabulary_file.write(
+            json.dumps({token: int(column) for token, column in vocabulary.items()}).encode()))
+    if idf is not None:
+        replace_file(os.path.join(cache_dir, f"{key}_idf.npy"), lambda idf_file: np.save(idf_file, idf))
+
+    replace_file(os.path.join(cache_dir, f"{key}.npz"),
+                 lambda matrix_file: sparse.save_npz(matrix_file, sparse.csr_matrix(matrix)))
+
+    if slot is not None:
+        prune_slot(cache_dir, slot, key)
+
+def prune_slot(cache_dir, slot, key):
+
+    """
+    Records key as the latest for a slot in slots.json and deletes the files of the key it replaces, unless
+    another slot still uses them.
+    """
+
+    slots_path = os.path.join(cache_dir, "slots.json")
+    slots = {}
+    if os.path.exists(slots_path):
+        with open(slots_path) as slots_file:
+            slots = json.load(slots_file)
+
+    previous = slots.get(slot)
+    slots[slot] = key
+    replace_file(slots_path, lambda slots_file: slots_file.write(json.dumps(slots, indent=2, sort_keys=True).encode()))
+
+    if previous is not None and previous not in slots.values():
+        for suffix in [".npz", "_vocabulary.json", "_idf.npy"]:
+            if os.path.exists(os.path.join(cache_dir, f"{previous}{suffix}")):
+                os.remove(os.path.join(cache_dir, f"{previous}{suffix}"))
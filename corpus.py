@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import polars as pl
+import re
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+column_names = {
+    'Internal ID': 'internal_id',
+    'Document Type': 'document_type',
+    'Parent ID': 'parent_id',
+    'Order': 'order',
+    'Parent Name': 'parent_name',
+    'UUID': 'uuid',
+    'Name': 'name',
+    'Website URL': 'website_url',
+    'Short URL': 'short_url',
+    'Image URL': 'image_url',
+    'Original Transcript': 'original_transcript',
+    'Text Only Transcript': 'text_only_transcript',
+    'People': 'people',
+    'Places': 'places',
+    'First Date': 'first_date',
+    'Dates': 'dates',
+    'Topics': 'topics'}
+
+unwanted_match_words = frozenset([
+
+    "Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"
+
+    ])
+
+# An escaped \r, \t or \n left in the export, or a word of two or more characters. Brackets and pipes match neither.
+token_pattern = re.compile(r"\\[rtn]|\w\w+")
+
+tag_markup = r"\||\[\[|\]\]|\\r|\\t|\\n"
+
+source_schema = {
+    'Internal ID': pl.Int64,
+    'UUID': pl.String,
+    'Text Only Transcript': pl.String,
+    'People': pl.String,
+    'Places': pl.String,
+    'Topics': pl.String}
+
+# Bump whenever load_corpus cleans the columns differently, so corpus caches written before are re-parsed.
+corpus_version = 1
+
+def source_key(data_path):
+
+    """
+    Fingerprints a CSV export by its resolved path, size and modification time, together with the schema and
+    version load_corpus cleans it with. Any change to the file, or a different file, gives a new key.
+    """
+
+    stat = os.stat(data_path)
+
+    return hashlib.sha1(json.dumps(
+        [os.path.realpath(data_path), stat.st_size, stat.st_mtime_ns, corpus_version,
+         {column: str(dtype) for column, dtype in source_schema.items()}]).encode()).hexdigest()
+
+def tokenize(text, stop_words=ENGLISH_STOP_WORDS, skip_unwanted_words=False):
+
+    """
+    Cleans and tokenizes one transcript or tag field in a single pass.
+
+    Args:
+        text (str): The raw field, markup and all.
+        stop_words (frozenset, optional): Lowercase words to drop. Defaults to scikit-learn's English list.
+        skip_unwanted_words (bool, optional): When True, the weekday and month names in unwanted_match_words
+                                              are dropped too. Set for the transcripts only, so tags such as
+                                              [[June Smith]] keep every word. Defaults to False.
+
+    Returns:
+        list: The lowercase tokens, as TfidfVectorizer's default analyzer would give them for the cleaned text.
+
+    Explanation:
+        - Tag markup ([[, ]], |) never forms part of a token, and escaped \\r, \\t and \\n sequences are
+          matched and skipped, so no cleaned copy of the text is built.
+        - Weekday and month names are dropped as whole, case-sensitive tokens when skip_unwanted_words is set.
+    """
+
+    return [
+        token.lower() for token in token_pattern.findall(text)
+        if token[0] != "\\" and not (skip_unwanted_words and token in unwanted_match_words)
+        and token.lower() not in stop_words]
+
+def load_corpus(data_path, cache_path=None):
+
+    """
+    Loads derived_data.csv and cleans it for scoring.
+
+    Args:
+        data_path (str): The path to derived_data.csv.
+        cache_path (str, optional): An Arrow IPC file the cleaned corpus is cached in. When it was written from
+                                    this same CSV it is memory-mapped instead of parsing the CSV again;
+                                    otherwise it is (re)written. Defaults to None (no cache).
+
+    Returns:
+        DataFrame: One row per journal entry with 'internal_id', 'uuid', the 'text_only_transcript', 'people',
+                   'places' and 'topics' columns with nulls as empty strings, plus 'tagless_people',
+                   'tagless_places' and 'tagless_topics' flags for entries with an empty tag field. Markup and
+                   unwanted words are left in place for tokenize to skip.
+
+    Explanation:
+        - The CSV is scanned lazily with the types in source_schema and no type inference, and only the
+          columns in source_schema are parsed; the transcripts with markup, URLs and dates are skipped.
+        - The cache is keyed by source_key, saved in a .key file next to it. The key is written after the
+          cache, so a cache from another CSV, an older export or an interrupted write is never served.
+    """
+
+    if cache_path is not None:
+        key = source_key(data_path)
+        key_path = f"{cache_path}.key"
+        if os.path.exists(cache_path) and os.path.exists(key_path):
+            with open(key_path) as key_file:
+                if key_file.read() == key:
+                    return pl.read_ipc(cache_path)
+
+    df = pl\
+        .scan_csv(data_path, schema_overrides=source_schema, infer_schema=False)\
+        .select([pl.col(column).alias(column_names[column]) for column in source_schema])\
+        .with_columns([
+            pl.col("text_only_transcript").fill_null(""),
+            pl.col("people").fill_null(""),
+            pl.col("places").fill_null(""),
+            pl.col("topics").fill_null("")])\
+        .with_columns([
+            (pl.col("people").str.strip_chars() == "").alias("tagless_people"),
+            (pl.col("places").str.strip_chars() == "").alias("tagless_places"),
+            (pl.col("topics").str.strip_chars() == "").alias("tagless_topics")])\
+        .collect()
+
+    if cache_path is not None:
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        df.write_ipc(cache_path, compression='uncompressed')
+        with open(key_path, "w") as key_file:
+            key_file.write(key)
+
+    return df
+
+def write_display(df, output_dir):
+
+    """
+    Writes the display-ready files the Streamlit app loads instead of parsing derived_data.csv.
+
+    Args:
+        df (DataFrame): The journal entries, as returned by load_corpus.
+        output_dir (str): The folder the files are written to, next to the closest_<facet>_df.parquet files.
+
+    Explanation:
+        - display.arrow holds the Int32 'internal_id' and the 'people', 'places' and 'topics' tags with
+          their markup replaced by ', ', the way the app shows them.
+        - transcripts.arrow holds the 'text_only_transcript' of the same rows with the markup replaced by
+          a space. It is kept apart so the app can memory-map it and read only the transcripts on screen.
+        - Both are uncompressed Arrow IPC, so they can be memory-mapped, and each is written to a temporary
+          file and swapped in whole, so a running app that has the old file mapped is not disturbed.
+    """
+
+    display = df.select([
+        pl.col("internal_id").cast(pl.Int32),
+        pl.col("people").str.replace_all(tag_markup, ", "),
+        pl.col("places").str.replace_all(tag_markup, ", "),
+        pl.col("topics").str.replace_all(tag_markup, ", ")])
+    transcripts = df.select(pl.col("text_only_transcript").str.replace_all(tag_markup, " "))
+
+    for frame, name in ((display, "display.arrow"), (transcripts, "transcripts.arrow")):
+        path = os.path.join(output_dir, name)
+        frame.write_ipc(f"{path}.tmp", compression='uncompressed')
+        os.replace(f"{path}.tmp", path)
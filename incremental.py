@@ -0,0 +1,142 @@
+import hashlib
+import numpy as np
+import polars as pl
+
+from similarity import blocked_similarity, topk_neighbours
+
+fingerprint_columns = ['text_only_transcript', 'people', 'places', 'topics']
+
+def fingerprint(df):
+
+    """
+    Fingerprints every journal entry by its UUID and a hash of its transcript and tag columns.
+
+    Args:
+        df (DataFrame): The cleaned journal entries, as returned by load_corpus.
+
+    Returns:
+        DataFrame: A 'uuid' column and a 'fingerprint' column holding the hex SHA-1 of the entry's content.
+    """
+
+    hashes = [
+        hashlib.sha1("\x1f".join(values).encode()).hexdigest()
+        for values in df.select(fingerprint_columns).iter_rows()]
+
+    return df\
+        .select("uuid")\
+        .with_columns(pl.Series("fingerprint", hashes))
+
+def diff_fingerprints(previous, current):
+
+    """
+    Compares two sets of fingerprints.
+
+    Args:
+        previous (DataFrame): The fingerprints saved by the last run.
+        current (DataFrame): The fingerprints of the corpus being scored now.
+
+    Returns:
+        tuple: (added, changed, removed) sets of UUIDs.
+    """
+
+    joined = current.join(previous, on="uuid", how="left", suffix="_previous")
+
+    added = joined.filter(pl.col("fingerprint_previous").is_null())["uuid"]
+    changed = joined.filter(pl.col("fingerprint") != pl.col("fingerprint_previous"))["uuid"]
+    removed = previous.filter(~pl.col("uuid").is_in(current["uuid"].to_list()))["uuid"]
+
+    return set(added.to_list()), set(changed.to_list()), set(removed.to_list())
+
+def neighbour_state(uuids, indices, scores):
+
+    """
+    Converts row-position neighbours into a frame keyed by UUID, so it survives rows being added or removed.
+
+    Args:
+        uuids (Series): The UUID of every journal entry, in row order.
+        indices (ndarray): An (N, k) array of neighbour row positions, as returned by topk_neighbours.
+                           Positions of -1 (rows that were not ranked) are saved as nulls.
+        scores (ndarray): The matching (N, k) similarity scores.
+
+    Returns:
+        DataFrame: 'uuid', 'neighbour_0'..'neighbour_{k-1}' (UUIDs) and 'score_0'..'score_{k-1}' columns.
+    """
+
+    # The trailing None is what a position of -1 picks up.
+    labels = np.append(uuids.to_numpy().astype(object), None)
+
+    return pl.DataFrame({"uuid": uuids})\
+        .with_columns(
+            [pl.Series(f"neighbour_{rank}", labels[indices[:, rank]].tolist(), dtype=uuids.dtype)
+             for rank in range(indices.shape[1])] +
+            [pl.Series(f"score_{rank}", scores[:, rank]) for rank in range(scores.shape[1])])
+
+def align_state(state, uuids, k):
+
+    """
+    Lines a saved neighbour state up with the current rows.
+
+    Returns:
+        tuple: (indices, scores) arrays of shape (N, k). Rows without a saved state, and neighbours
+               that no longer exist, get an index of -1 and a score of NaN.
+    """
+
+    positions = {uuid: position for position, uuid in enumerate(uuids.to_list())}
+
+    aligned = pl.DataFrame({"uuid": uuids})\
+        .with_row_index("row")\
+        .join(state, on="uuid", how="left")\
+        .sort("row")
+
+    neighbours = aligned.select([f"neighbour_{rank}" for rank in range(k)]).to_numpy()
+    indices = np.vectorize(lambda uuid: positions.get(uuid, -1), otypes=[np.int64])(neighbours)
+    scores = aligned.select([f"score_{rank}" for rank in range(k)]).to_numpy().astype(np.float32)
+
+    return indices, scores
+
+def update_neighbours(tfidf_matrix, indices, scores, changed_rows, rows, quantile=None, block_size=512, pin_self=False,
+                      workers=1):
+
+    """
+    Re-ranks, in place, the rows of an aligned neighbour state whose top k could have changed.
+
+    Args:
+        tfidf_matrix (csr_matrix): The TF-IDF matrix of the current corpus the rows are ranked by.
+        indices (ndarray): The (N, k) neighbour positions returned by align_state. Updated in place.
+        scores (ndarray): The matching (N, k) scores. Updated in place.
+        changed_rows (ndarray): Positions of the entries that were added or whose content changed.
+        rows (ndarray): Positions of the entries ranked by this matrix; other rows are left alone.
+        quantile (float, optional): The per-entry threshold quantile, as in topk_neighbours. Defaults to None.
+        block_size (int, optional): The number of rows scored per block. Defaults to 512.
+        pin_self (bool, optional): Whether each entry is pinned first in its own list, as in topk_neighbours.
+                                   Defaults to False.
+        workers (int, optional): The number of processes the stale rows are re-ranked with. Defaults to 1.
+
+    Returns:
+        ndarray: The positions of the rows that were re-ranked.
+
+    Explanation:
+        - Rows that are new or changed, or whose saved neighbours include a changed or removed
+          entry, are recomputed.
+        - The changed rows are scored against the corpus. Any other row that one of them now beats
+          the saved k-th score of is recomputed as well, since its top k could have changed.
+        - Every other row keeps its saved neighbours. Their scores are not refreshed for the small
+          IDF and quantile drift the new pages cause, so a full run is still worth doing now and then.
+    """
+
+    stale = (indices < 0).any(axis=1)
+    stale[changed_rows] = True
+    stale |= np.isin(indices, changed_rows).any(axis=1)
+
+    reach = np.zeros(len(indices))
+    for start, stop, block in blocked_similarity(tfidf_matrix, block_size, changed_rows):
+        reach = np.maximum(reach, block.max(axis=0).toarray().ravel())
+    stale |= reach > scores[:, -1]
+
+    stale_rows = np.intersect1d(np.flatnonzero(stale), rows)
+    if len(stale_rows):
+        indices[stale_rows], scores[stale_rows] = topk_neighbours(
+            tfidf_matrix, k=indices.shape[1], quantile=quantile, block_size=block_size, rows=stale_rows,
+            pin_self=pin_self, workers=workers)
+
+    return stale_rows
@@ -0,0 +1,134 @@
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+# ru_maxrss is in KiB on Linux but in bytes on macOS.
+maxrss_scale = 1 / 1024 ** 2 if sys.platform == "darwin" else 1 / 1024
+
+def reset_peak_rss():
+
+    """
+    Resets this process's resident memory high-water mark, so peak_rss_mb reports the peak from here on.
+
+    Returns:
+        bool: True if the mark was reset. Only Linux supports this (by writing 5 to /proc/self/clear_refs);
+              elsewhere peak_rss_mb keeps reporting the peak over the life of the process.
+    """
+
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+
+    return True
+
+def peak_rss_mb():
+
+    """
+    Returns the peak resident memory of this process since reset_peak_rss was last called, in MiB.
+
+    Explanation:
+        - On Linux this is VmHWM from /proc/self/status, which reset_peak_rss can lower. Elsewhere it is
+          ru_maxrss, the peak over the life of the process.
+    """
+
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * maxrss_scale
+
+def child_peak_rss_mb():
+
+    """
+    Returns the peak resident memory of the largest finished child process so far, in MiB, or 0 if none
+    has finished.
+    """
+
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * maxrss_scale
+
+def cpu_seconds():
+
+    """
+    Returns the user and system CPU time used so far by this process and its finished child processes.
+    """
+
+    return sum(usage.ru_utime + usage.ru_stime for usage in (
+        resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+@contextmanager
+def measure(report, stage, rows=None):
+
+    """
+    Measures a stage of a run and appends its metrics to a report.
+
+    Args:
+        report (list): The stage records of the run so far. The new record is appended once the stage finishes.
+        stage (str): The name of the stage.
+        rows (int, optional): The number of entries the stage processes, for its throughput. It can also be set
+                              on the yielded record once it is known. Defaults to None.
+
+    Yields:
+        dict: The stage's record.
+
+    Explanation:
+        - wall_seconds and cpu_seconds are the elapsed and CPU time of the stage. The CPU time includes the
+          worker processes that finished during the stage, so it can exceed the wall time.
+        - peak_rss_mb is the process's peak resident memory during the stage. The high-water mark is reset
+          when the stage starts on Linux; elsewhere it is the peak so far, which never goes down.
+        - child_peak_rss_mb is the peak of the largest worker process so far, when one that finished during
+          the stage set it, and None otherwise. The operating system keeps only that one figure for finished
+          children, so it cannot be reset per stage. It is reported apart from the process's own peak.
+        - rows_per_second is rows / wall_seconds.
+    """
+
+    record = {"stage": stage, "rows": rows}
+    reset_peak_rss()
+    child_start = child_peak_rss_mb()
+    wall_start, cpu_start = time.perf_counter(), cpu_seconds()
+
+    yield record
+
+    wall = time.perf_counter() - wall_start
+    record["wall_seconds"] = round(wall, 4)
+    record["cpu_seconds"] = round(cpu_seconds() - cpu_start, 4)
+    record["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    child_peak = child_peak_rss_mb()
+    record["child_peak_rss_mb"] = round(child_peak, 1) if child_peak > child_start else None
+    record["rows_per_second"] = round(record["rows"] / wall, 1) if record["rows"] and wall > 0 else None
+    report.append(record)
+
+def write_report(report_path, report, **details):
+
+    """
+    Writes a run report as JSON.
+
+    Args:
+        report_path (str): The file the report is written to. Its folder is created if needed.
+        report (list): The stage records collected by measure.
+        **details: Anything else worth keeping with the run, e.g. its settings, corpus size and total times.
+
+    Explanation:
+        - peak_rss_mb is the highest stage peak, and child_peak_rss_mb the peak of the largest worker
+          process of the run, or None if it used none.
+    """
+
+    peak = max([round(peak_rss_mb(), 1)] + [record["peak_rss_mb"] for record in report if "peak_rss_mb" in record])
+    child_peak = child_peak_rss_mb()
+
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w") as report_file:
+        json.dump({
+            **details,
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "peak_rss_mb": peak,
+            "child_peak_rss_mb": round(child_peak, 1) if child_peak else None,
+            "stages": report}, report_file, indent=2)
@@ -0,0 +1,424 @@
+import argparse
+import hashlib
+import json
+import numpy as np
+import polars as pl
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from ann import ann_neighbours
+from cache import column_key
+from corpus import load_corpus, write_display
+from incremental import align_state, diff_fingerprints, fingerprint, neighbour_state, update_neighbours
+from metrics import cpu_seconds, measure, write_report
+from minhash import create_tag_matrix, minhash_neighbours
+from similarity import create_hashed_tfidf_matrix, create_tfidf_matrix, stack_matrices, topk_neighbours
+from stages import load_manifest, record_stage, stage_keys, stale_stages
+
+facets = ["people", "places", "topics"]
+
+combined_weights = {"people": 1.0, "places": 1.0, "topics": 1.0, "text": 1.0}
+
+def closest_indices_df(indices, ids, scores=None):
+
+    """
+    Labels the top matches (closest indices) of each journal entry with internal IDs.
+
+    Args:
+        indices (ndarray): An (N, k) array of row positions, best match first, as returned by topk_neighbours.
+        ids (Series): A series of internal IDs corresponding to each journal entry, used for labeling.
+        scores (ndarray, optional): The matching (N, k) similarity scores. Defaults to None (no score columns).
+
+    Returns:
+        DataFrame: A DataFrame where each row corresponds to a journal entry, and columns indicate the top matches.
+
+    Explanation:
+        - Each row position is mapped to the internal ID of the journal entry it points at.
+        - The columns are named after the rank of each match (closest_0, closest_1, etc.) and hold Int32 IDs.
+        - When scores are given, score_0, score_1, etc. hold the Float32 similarity of each match, so the
+          matches can be re-thresholded without computing the similarity again.
+    """
+
+    labels = ids.cast(pl.Int32).to_numpy()
+    score_columns = [] if scores is None else [
+        pl.Series(f"score_{rank}", scores[:, rank], dtype=pl.Float32) for rank in range(scores.shape[1])]
+
+    return pl.DataFrame({"internal_id": ids.cast(pl.Int32)})\
+        .with_columns([
+            pl.Series(f"closest_{rank}", labels[indices[:, rank]]) for rank in range(indices.shape[1])] +
+            score_columns)
+
+def tagless_rows(df, facet, tfidf_matrix_var):
+
+    """
+    Finds the journal entries with no usable tags for a facet.
+
+    Args:
+        df (DataFrame): The cleaned journal entries, as returned by load_corpus.
+        facet (str): One of 'people', 'places' or 'topics'.
+        tfidf_matrix_var (csr_matrix): The TF-IDF matrix of the facet's tags, or its tag matrix from create_tag_matrix.
+
+    Returns:
+        ndarray: The positions of the entries whose tag field was empty at ingest, or whose tags were
+                 made up only of stop words and so vectorized to an empty row.
+    """
+
+    empty = np.diff(tfidf_matrix_var.indptr) == 0
+    return np.flatnonzero(df[f"tagless_{facet}"].to_numpy() | empty)
+
+def sim_maker(tfidf_matrix, indices, scores, rows, quantile=None, changed_rows=None, workers=1, ann_probe=None,
+              similarity="cosine"):
+
+    """
+    Finds the closest journal entries for the given rows of a TF-IDF matrix, where each row represents a journal
+    entry. The TF-IDF matrix captures the importance of words in the context of the whole dataset; the cosine
+    similarity between the given entries and every entry is computed block by block, and only the top k matches
+    of each entry are kept. Each entry is its own closest_0, followed by its k - 1 best matches among the others.
+
+    Args:
+        tfidf_matrix (csr_matrix): The TF-IDF matrix of the column the entries are compared on.
+        indices (ndarray): An (N, k) array receiving the row positions of each entry's matches, best first.
+        scores (ndarray): An (N, k) array receiving the matching similarity scores.
+        rows (ndarray): The positions of the entries to rank. Other rows of indices and scores are left alone.
+        quantile (float, optional): The per-entry percentile at or below which similarity scores are discarded.
+                                    Defaults to None (no thresholding).
+        changed_rows (ndarray, optional): For incremental runs, the positions of the entries added or changed
+                                          since indices and scores were saved. Only the rows those changes can
+                                          affect are re-ranked. Defaults to None (every given row is ranked).
+        workers (int, optional): The number of processes the similarity blocks are spread over. Defaults to 1.
+        ann_probe (int, optional): When given, the entries are ranked approximately by the random-projection
+                                   index in ann.py, scoring every member of this many cells per entry exactly
+                                   (more cells: slower, higher recall). Incremental updates stay exact.
+                                   Defaults to None (exact).
+        similarity (str, optional): 'cosine' for TF-IDF cosine similarity, or 'minhash' to rank by the Jaccard
+                                    similarity of tag sets found through MinHash LSH (see minhash.py), in which
+                                    case tfidf_matrix is the tag matrix from create_tag_matrix and every given
+                                    row is re-ranked, even in incremental runs. Defaults to 'cosine'.
+    """
+
+    if similarity == "minhash":
+        indices[rows], scores[rows] = minhash_neighbours(
+            tfidf_matrix, k=indices.shape[1], quantile=quantile, rows=rows, pin_self=True)
+    elif changed_rows is None and ann_probe is not None:
+        indices[rows], scores[rows] = ann_neighbours(
+            tfidf_matrix, k=indices.shape[1], quantile=quantile, rows=rows, pin_self=True, n_probe=ann_probe)
+    elif changed_rows is None:
+        indices[rows], scores[rows] = topk_neighbours(
+            tfidf_matrix, k=indices.shape[1], quantile=quantile, rows=rows, pin_self=True, workers=workers)
+    else:
+        update_neighbours(
+            tfidf_matrix, indices, scores, changed_rows, rows, quantile=quantile, pin_self=True, workers=workers)
+
+def rank_facet(facet, facet_matrix, indices, scores, tagged, changed_rows=None, workers=1, similarity="cosine"):
+
+    """
+    Ranks a facet's tagged entries with sim_maker and returns the updated indices and scores, together with the
+    stage's metrics measured in the process it ran in, so facets can be ranked in separate processes.
+    """
+
+    report = []
+    with measure(report, f"rank_{facet}", rows=len(tagged)):
+        sim_maker(facet_matrix, indices, scores, tagged, quantile=.75, changed_rows=changed_rows, workers=workers,
+                  similarity=similarity)
+
+    return indices, scores, report[0]
+
+def run(data_path, output_dir='.', incremental=False, state_dir=None, workers=1, ann_probe=None, tag_similarity="cosine",
+        cache_dir=None, corpus_cache=None, hashing=False, k=4, force=False, report_path=None, combined=None):
+
+    """
+    Scores every facet from a single pass over derived_data.csv and writes closest_<facet>_df.parquet files,
+    along with the display files the app reads (see write_display).
+
+    Args:
+        data_path (str): The path to derived_data.csv.
+        output_dir (str, optional): The folder the parquet files are written to. Defaults to the current folder.
+        incremental (bool, optional): When True and a previous run saved its state, only the entries
+                                      affected by added, changed or removed pages are re-ranked. Defaults to False.
+        state_dir (str, optional): The folder holding the fingerprints and neighbour lists used by incremental
+                                   runs, and the stage manifest. Defaults to a 'refresh_state' folder inside output_dir.
+        workers (int, optional): The number of processes each similarity pass is spread over, and the number of
+                                 facets ranked at once. Defaults to 1.
+        ann_probe (int, optional): When given, the transcript fallback is ranked approximately, searching this
+                                   many cells of the random-projection index per entry; see sim_maker.
+                                   Defaults to None (exact).
+        tag_similarity (str, optional): 'cosine' to compare the people, places and topics tags by TF-IDF cosine
+                                        similarity, or 'minhash' to compare whole tag sets by Jaccard similarity
+                                        through MinHash LSH. Defaults to 'cosine'.
+        cache_dir (str, optional): The folder fitted vectorizers and matrices are cached in, so a column that
+                                   has not changed is not vectorized again. Defaults to a 'vector_cache'
+                                   folder inside output_dir.
+        corpus_cache (str, optional): The Arrow IPC file the cleaned corpus is cached in; see load_corpus.
+                                      Defaults to 'corpus.arrow' inside output_dir.
+        hashing (bool, optional): When True, the TF-IDF matrices are built chunk by chunk with feature hashing
+                                  (see create_hashed_tfidf_matrix), spread over the workers, instead of by
+                                  fitting a vocabulary over the whole column. Defaults to False.
+        k (int, optional): The number of closest_ and score_ columns written per entry, counting the entry itself
+                           as closest_0. The app reads closest_1 to closest_3, so it needs at least 4. Defaults to 4.
+        force (bool, optional): When True, every stage runs, even if its inputs are unchanged. Defaults to False.
+        report_path (str, optional): The JSON file the run report is written to; see metrics.py. Defaults to
+                                     'run_report.json' inside output_dir.
+        combined (dict, optional): When given, closest_combined_df.parquet is also written, ranking every entry by
+                                   a blend of its people, places, topics and transcript similarities weighted
+                                   by this dict (missing keys take their combined_weights default).
+                                   Defaults to None (no blend).
+
+    Explanation:
+        - The CSV is parsed and cleaned once, and the transcript TF-IDF matrix is fitted at most once.
+        - Entries without tags for a facet are left out of that facet's similarity. Instead, the entries
+          that are tagless in any facet are ranked once by transcript similarity against the whole corpus,
+          and each facet takes its tagless entries' matches from there.
+        - The ranking is split into stages (see stages.py): a 'text' stage for the transcript fallback and one
+          stage per facet, which depends on it. Each stage declares its inputs (the columns and rows it ranks and
+          the settings that change its result) and its output files. A stage whose inputs hash the same as on its
+          last completed run, and whose outputs still exist, is skipped.
+        - With several workers, the facets that have to run are ranked in separate processes at once.
+        - The app's display.arrow and transcripts.arrow are written by a 'display' stage, which only reruns
+          when the transcripts or tags change.
+        - The blend is a 'combined' stage of its own. The four matrices are stacked side by side with
+          stack_matrices and ranked in one pass, rather than ranking each and merging the lists.
+        - Every stage saves its neighbour lists together with the fingerprints of the entries they were ranked
+          against, tagged with a hash of the settings it was ranked with, so an incremental run diffs each
+          stage against its own last run, however many runs ago that was. A saved state written with a different k or
+          other settings (tag_similarity, hashing, ann_probe or the combined weights) is ignored, and that
+          state is rebuilt in full.
+        - Every step is measured (wall time, CPU time, peak memory and entries per second) and the
+          measurements are written to the run report, with skipped stages listed as such.
+    """
+
+    if tag_similarity not in ("cosine", "minhash"):
+        raise ValueError(f"tag_similarity must be 'cosine' or 'minhash', not {tag_similarity!r}")
+    if combined is not None:
+        if not set(combined) <= set(combined_weights):
+            raise ValueError(f"combined weights must be among {list(combined_weights)}, not {list(combined)}")
+        combined = {**combined_weights, **combined}
+        if min(combined.values()) < 0 or sum(combined.values()) <= 0:
+            raise ValueError(f"combined weights must be non-negative and not all 0, not {combined}")
+
+    if state_dir is None:
+        state_dir = os.path.join(output_dir, "refresh_state")
+    if cache_dir is None:
+        cache_dir = os.path.join(output_dir, "vector_cache")
+    if corpus_cache is None:
+        corpus_cache = os.path.join(output_dir, "corpus.arrow")
+    if report_path is None:
+        report_path = os.path.join(output_dir, "run_report.json")
+    os.makedirs(state_dir, exist_ok=True)
+    manifest_path = os.path.join(state_dir, "stages.json")
+
+    def state_path(name):
+        return os.path.join(state_dir, f"neighbours_{name}.parquet")
+
+    def output_path(name):
+        return os.path.join(output_dir, f"closest_{name}_df.parquet")
+
+    def load_state(name):
+        state = None
+        if incremental and os.path.exists(state_path(name)) \
+                and pl.read_parquet_metadata(state_path(name)).get("settings") == state_keys[name]:
+            state = pl.read_parquet(state_path(name))
+        if state is None or "fingerprint" not in state.columns \
+                or f"neighbour_{k - 1}" not in state.columns or f"neighbour_{k}" in state.columns:
+            return np.full((len(df), k), -1, dtype=np.int64), np.full((len(df), k), np.nan, dtype=np.float32), None
+        # Each state is diffed against the fingerprints it was ranked with, which can be older than the last
+        # run's if this stage was skipped or left out since.
+        added, modified, removed = diff_fingerprints(state.select("uuid", "fingerprint"), fingerprints)
+        print(f"2b: '{name}': {len(added)} added, {len(modified)} changed, {len(removed)} removed")
+        changed_rows = np.flatnonzero(df["uuid"].is_in(list(added | modified)).to_numpy())
+        return *align_state(state, df["uuid"], k), changed_rows
+
+    def save_state(name, indices, scores):
+        neighbour_state(df["uuid"], indices, scores)\
+            .with_columns(fingerprints["fingerprint"])\
+            .write_parquet(state_path(name), metadata={"settings": state_keys[name]})
+
+    report = []
+    wall_start, cpu_start = time.perf_counter(), cpu_seconds()
+
+    def finish():
+        write_report(report_path, report, data_path=os.path.abspath(data_path), entries=len(df),
+                     settings={"k": k, "workers": workers, "ann_probe": ann_probe, "tag_similarity": tag_similarity,
+                               "hashing": hashing, "incremental": incremental},
+                     wall_seconds=round(time.perf_counter() - wall_start, 4),
+                     cpu_seconds=round(cpu_seconds() - cpu_start, 4))
+
+    print("1: Loading data")
+    with measure(report, "load") as record:
+        df = load_corpus(data_path, corpus_cache)
+        fingerprints = fingerprint(df)
+        record["rows"] = len(df)
+
+    def vectorize(column):
+        # Weekday and month names are dropped from the transcripts only; in tags they are part of names.
+        skip_unwanted_words = column == "text_only_transcript"
+        if hashing:
+            return create_hashed_tfidf_matrix(
+                df[column], cache_dir=cache_dir, workers=workers, skip_unwanted_words=skip_unwanted_words)
+        return create_tfidf_matrix(df[column], cache_dir=cache_dir, skip_unwanted_words=skip_unwanted_words)
+
+    print("2: Vectorizing Tags")
+    with measure(report, "vectorize_tags", rows=len(df)):
+        if tag_similarity == "minhash":
+            facet_matrices = {facet: create_tag_matrix(df[facet], cache_dir=cache_dir) for facet in facets}
+        else:
+            facet_matrices = {facet: vectorize(facet) for facet in facets}
+        tagless = {facet: tagless_rows(df, facet, facet_matrices[facet]) for facet in facets}
+
+    with measure(report, "hash_inputs", rows=len(df)):
+        column_keys = {column: column_key(df[column], 'column') for column in ["text_only_transcript"] + facets}
+        column_keys["internal_id"] = column_key(df["internal_id"].cast(pl.String), 'column')
+    fallback_rows = np.unique(np.concatenate(list(tagless.values())))
+    settings = {"k": k, "hashing": hashing, "tag_similarity": tag_similarity}
+    stages = {"text": {
+        "inputs": [column_keys["text_only_transcript"], hashlib.sha1(fallback_rows.tobytes()).hexdigest(),
+                   settings, ann_probe],
+        "after": [], "outputs": [state_path("text")]}}
+    for facet in facets:
+        stages[facet] = {
+            "inputs": [column_keys[facet], column_keys["internal_id"], settings], "after": ["text"],
+            "outputs": [state_path(facet), output_path(facet)]}
+    stages["display"] = {
+        "inputs": [column_keys], "after": [],
+        "outputs": [os.path.join(output_dir, "display.arrow"), os.path.join(output_dir, "transcripts.arrow")]}
+    if combined is not None:
+        stages["combined"] = {
+            "inputs": [column_keys, settings, ann_probe, combined], "after": [],
+            "outputs": [state_path("combined"), output_path("combined")]}
+
+    keys = stage_keys(stages)
+    # The settings each saved neighbour state was ranked with, so an incremental run never builds on lists
+    # ranked another way (e.g. by MinHash rather than cosine, or approximately).
+    state_settings = {"text": [settings, ann_probe], **{facet: [settings] for facet in facets}}
+    if combined is not None:
+        state_settings["combined"] = [settings, ann_probe, combined]
+    state_keys = {name: hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+                  for name, value in state_settings.items()}
+    manifest = load_manifest(manifest_path)
+    stale = stale_stages(stages, keys, manifest, force)
+    for name in stages:
+        if name not in stale:
+            print(f"2a: Skipping '{name}', its inputs are unchanged")
+            report.append({"stage": name, "skipped": True})
+    if not stale:
+        finish()
+        return
+
+    if "display" in stale:
+        with measure(report, "write_display", rows=len(df)):
+            write_display(df, output_dir)
+        record_stage(manifest_path, manifest, "display", keys["display"])
+
+    if "text" in stale or "combined" in stale:
+        with measure(report, "vectorize_text", rows=len(df)):
+            tfidf_wwtext = vectorize("text_only_transcript")
+
+    if "text" in stale:
+        print("3: Ranking Tagless Entries by Transcript")
+        text_indices, text_scores, text_changed = load_state("text")
+        with measure(report, "rank_text", rows=len(fallback_rows)):
+            sim_maker(tfidf_wwtext, text_indices, text_scores, fallback_rows,
+                      changed_rows=text_changed, workers=workers, ann_probe=ann_probe)
+        with measure(report, "write_text", rows=len(df)):
+            save_state("text", text_indices, text_scores)
+        record_stage(manifest_path, manifest, "text", keys["text"])
+    elif any(facet in stale for facet in facets):
+        text_indices, text_scores = align_state(pl.read_parquet(state_path("text")), df["uuid"], k)
+
+    ranked = [facet for facet in facets if facet in stale]
+    if ranked:
+        print("4: Calculating Closest Indices")
+        concurrent = workers > 1 and len(ranked) > 1
+        jobs = []
+        for facet in ranked:
+            indices, scores, facet_changed = load_state(facet)
+            tagged = np.setdiff1d(np.arange(len(df)), tagless[facet])
+            jobs.append((facet, facet_matrices[facet], indices, scores, tagged, facet_changed,
+                         1 if concurrent else workers, tag_similarity))
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranked))) if concurrent else nullcontext() as executor:
+            rankings = (executor.map if concurrent else map)(rank_facet, *zip(*jobs))
+
+            for facet, (indices, scores, record) in zip(ranked, rankings):
+                print(f"4{'abc'[facets.index(facet)]}: {facet.title()}")
+                report.append(record)
+                with measure(report, f"write_{facet}", rows=len(df)):
+                    indices[tagless[facet]] = text_indices[tagless[facet]]
+                    scores[tagless[facet]] = text_scores[tagless[facet]]
+                    save_state(facet, indices, scores)
+
+                    closest_indices_df(indices, df["internal_id"], scores).write_parquet(output_path(facet))
+                record_stage(manifest_path, manifest, facet, keys[facet])
+
+    if "combined" in stale:
+        print("5: Ranking Every Entry by All Facets Combined")
+        indices, scores, combined_changed = load_state("combined")
+        with measure(report, "rank_combined", rows=len(df)):
+            stacked = stack_matrices(
+                [facet_matrices[facet] for facet in facets] + [tfidf_wwtext],
+                [combined[facet] for facet in facets] + [combined["text"]])
+            sim_maker(stacked, indices, scores, np.arange(len(df)), changed_rows=combined_changed, workers=workers,
+                      ann_probe=ann_probe)
+        with measure(report, "write_combined", rows=len(df)):
+            save_state("combined", indices, scores)
+            closest_indices_df(indices, df["internal_id"], scores).write_parquet(output_path("combined"))
+        record_stage(manifest_path, manifest, "combined", keys["combined"])
+
+    finish()
+
+if __name__ == "__main__":
+
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(
+        description="Writes the closest_<facet>_df.parquet files, skipping the stages whose inputs are unchanged.")
+    parser.add_argument("--data", default=os.path.join(here, "derived_data.csv"),
+                        help="the path to derived_data.csv (default: next to this script)")
+    parser.add_argument("--output-dir", default=here,
+                        help="the folder the parquet files are written to (default: this script's folder)")
+    parser.add_argument("--state-dir", default=None,
+                        help="the folder for the incremental state and stage manifest (default: OUTPUT_DIR/refresh_state)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="the folder fitted matrices are cached in (default: OUTPUT_DIR/vector_cache)")
+    parser.add_argument("--corpus-cache", default=None,
+                        help="the Arrow file the cleaned corpus is cached in (default: OUTPUT_DIR/corpus.arrow)")
+    parser.add_argument("--k", type=int, default=4,
+                        help="the number of matches kept per entry, counting the entry itself; the app needs at least 4")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-rank the entries affected by pages added or changed since the last run")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="the number of CPU cores to use, e.g. os.cpu_count()")
+    parser.add_argument("--ann-probe", type=int, default=None,
+                        help="rank the transcript fallback approximately, scoring the entries of this many cells per "
+                             "entry; see the README's recall table before picking a value")
+    parser.add_argument("--tag-similarity", choices=["cosine", "minhash"], default="cosine",
+                        help="match entries on TF-IDF weighted tag words (cosine) or the overlap of whole tag sets (minhash)")
+    parser.add_argument("--hashing", action="store_true",
+                        help="vectorize in chunks with feature hashing, bounding memory by the chunk rather than the corpus")
+    parser.add_argument("--force", action="store_true",
+                        help="run every stage, even those whose inputs are unchanged")
+    parser.add_argument("--report", default=None,
+                        help="the JSON file per-stage timings and memory are written to (default: OUTPUT_DIR/run_report.json)")
+    parser.add_argument("--combined", nargs="*", metavar="NAME=WEIGHT", default=None,
+                        help="also write closest_combined_df.parquet, blending people, places, topics and text "
+                             "with these weights, e.g. --combined people=2 text=0.5 (default weight: 1)")
+    args = parser.parse_args()
+
+    combined = None
+    if args.combined is not None:
+        combined = {}
+        for pair in args.combined:
+            try:
+                name, weight = pair.split("=")
+                combined[name] = float(weight)
+            except ValueError:
+                parser.error(f"argument --combined: invalid NAME=WEIGHT pair: {pair!r} (e.g. people=2)")
+        unknown = set(combined) - set(combined_weights)
+        if unknown:
+            parser.error(f"argument --combined: invalid name(s) {sorted(unknown)} (choose from {list(combined_weights)})")
+
+    run(args.data, output_dir=args.output_dir, incremental=args.incremental, state_dir=args.state_dir,
+        workers=args.workers, ann_probe=args.ann_probe, tag_similarity=args.tag_similarity, cache_dir=args.cache_dir,
+        corpus_cache=args.corpus_cache, hashing=args.hashing, k=args.k, force=args.force, report_path=args.report,
+        combined=combined)
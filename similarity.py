@@ -0,0 +1,566 @@
+import multiprocessing
+import numpy as np
+import os
+import tempfile
+from functools import partial
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from cache import column_key, load_matrix, save_matrix
+from corpus import token_pattern, tokenize, unwanted_match_words
+
+def create_tfidf_matrix(data, stop_words='english', cache_dir=None, skip_unwanted_words=False):
+
+    """
+    Fits a TF-IDF vectorizer on a column of text and returns the resulting sparse matrix.
+
+    Args:
+        data (Series): The raw column of text, one journal entry per row. It is cleaned and tokenized in one
+                       pass by corpus.tokenize.
+        stop_words (str or list, optional): 'english' for scikit-learn's English stop word list, a list of
+                                            words, or None. Defaults to 'english'.
+        cache_dir (str, optional): When given, the fitted vocabulary, IDF weights and matrix are saved there,
+                                   keyed by a hash of the column and the settings, and reloaded instead of
+                                   refitted when the same column comes through again. Defaults to None.
+        skip_unwanted_words (bool, optional): Whether weekday and month names are dropped; see corpus.tokenize.
+                                              Defaults to False.
+
+    Returns:
+        csr_matrix: A sparse (entries x vocabulary) TF-IDF matrix.
+    """
+
+    if cache_dir is not None:
+        key = column_key(data, 'tfidf', stop_words=stop_words, token_pattern=token_pattern.pattern,
+                         unwanted_match_words=sorted(unwanted_match_words) if skip_unwanted_words else [])
+        tfidf_matrix = load_matrix(cache_dir, key)
+        if tfidf_matrix is not None:
+            return tfidf_matrix
+
+    if stop_words == 'english':
+        stop_words = ENGLISH_STOP_WORDS
+
+    tfidf_vectorizer = TfidfVectorizer(analyzer=partial(
+        tokenize, stop_words=frozenset(stop_words or []), skip_unwanted_words=skip_unwanted_words))
+    tfidf_matrix = tfidf_vectorizer.fit_transform(data)
+
+    if cache_dir is not None:
+        save_matrix(cache_dir, key, tfidf_matrix, tfidf_vectorizer.vocabulary_, tfidf_vectorizer.idf_,
+                    slot=f"tfidf_{data.name}")
+
+    return tfidf_matrix
+
+def create_hashed_tfidf_matrix(data, stop_words='english', cache_dir=None, n_features=2 ** 20, chunk_size=10000,
+                               workers=1, skip_unwanted_words=False):
+
+    """
+    Builds a TF-IDF matrix chunk by chunk with feature hashing, so no vocabulary has to be fitted first.
+
+    Args:
+        data (Series): The raw column of text, one journal entry per row, tokenized by corpus.tokenize.
+        stop_words (str or list, optional): As in create_tfidf_matrix. Defaults to 'english'.
+        cache_dir (str, optional): A folder the matrix and IDF weights are cached in, as in create_tfidf_matrix.
+                                   Defaults to None.
+        n_features (int, optional): The number of hashed columns. Defaults to 2 ** 20.
+        chunk_size (int, optional): The number of entries vectorized at a time. Defaults to 10000.
+        workers (int, optional): The number of processes the chunks are vectorized by. Defaults to 1.
+        skip_unwanted_words (bool, optional): As in create_tfidf_matrix. Defaults to False.
+
+    Returns:
+        csr_matrix: A sparse (entries x n_features) TF-IDF matrix with L2-normalised rows.
+
+    Explanation:
+        - Each token is hashed straight to a column, so every chunk is vectorized on its own, possibly in
+          another process, and only one chunk's text and token lists are held at a time.
+        - Document frequencies are summed chunk by chunk, and the smoothed IDF weights scikit-learn uses
+          are applied to the stacked counts at the end. The result matches create_tfidf_matrix up to the
+          rare tokens that hash to the same column.
+    """
+
+    if cache_dir is not None:
+        key = column_key(data, 'hashed_tfidf', stop_words=stop_words, token_pattern=token_pattern.pattern,
+                         unwanted_match_words=sorted(unwanted_match_words) if skip_unwanted_words else [],
+                         n_features=n_features)
+        tfidf_matrix = load_matrix(cache_dir, key)
+        if tfidf_matrix is not None:
+            return tfidf_matrix
+
+    if stop_words == 'english':
+        stop_words = ENGLISH_STOP_WORDS
+
+    hashing_vectorizer = HashingVectorizer(
+        analyzer=partial(tokenize, stop_words=frozenset(stop_words or []), skip_unwanted_words=skip_unwanted_words),
+        n_features=n_features, alternate_sign=False, norm=None)
+    chunks = (data.slice(start, chunk_size).to_list() for start in range(0, len(data), chunk_size))
+
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            counts = list(pool.imap(hashing_vectorizer.transform, chunks))
+    else:
+        counts = [hashing_vectorizer.transform(chunk) for chunk in chunks]
+
+    document_frequency = sum(np.bincount(chunk.indices, minlength=n_features) for chunk in counts)
+    idf = np.log((1 + len(data)) / (1 + document_frequency)) + 1
+
+    tfidf_matrix = sparse.vstack(counts, format='csr') if counts else sparse.csr_matrix((0, n_features))
+    tfidf_matrix.data *= idf[tfidf_matrix.indices]
+    tfidf_matrix = normalize(tfidf_matrix, norm='l2')
+
+    if cache_dir is not None:
+        save_matrix(cache_dir, key, tfidf_matrix, idf=idf, slot=f"hashed_tfidf_{data.name}")
+
+    return tfidf_matrix
+
+def stack_matrices(matrices, weights):
+
+    """
+    Joins several vectorized columns of the same entries side by side into one weighted feature space.
+
+    Args:
+        matrices (list): The (entries x features) matrices, e.g. the people, places, topics and transcript
+                         TF-IDF matrices.
+        weights (list): The weight of each matrix in the blended similarity.
+
+    Returns:
+        csr_matrix: An (entries x total features) matrix.
+
+    Explanation:
+        - Each matrix is L2-normalised by row and scaled by sqrt(weight / sum of weights), so the dot product
+          of two stacked rows is the weighted mean of their cosine similarities in each matrix, with a matrix
+          in which either entry is empty counting as 0.
+        - topk_neighbours normalises the stacked rows again, so a pair's score is the weighted sum of its
+          cosine similarities divided by sqrt(W_i * W_j), where W_i is the total weight of the matrices entry i
+          has a vector in. The score is 1 only when two entries have vectors in the same matrices and match
+          in all of them. An entry with people tags and a transcript, set against a transcript-only entry
+          with the same text, scores 1 / sqrt(2) ~ 0.71 with equal weights.
+        - One pass of topk_neighbours over the stacked matrix therefore ranks the blend, at the cost of a single
+          pass over the combined non-zeros rather than one pass per matrix.
+    """
+
+    total = sum(weights)
+
+    return sparse.hstack(
+        [normalize(sparse.csr_matrix(matrix, dtype=np.float64), norm='l2') * np.sqrt(weight / total)
+         for matrix, weight in zip(matrices, weights) if weight > 0],
+        format='csr')
+
+def quantile_rank(n, quantile):
+
+    """
+    Returns the position of the requested quantile in a sorted sequence of length n. Matches polars'
+    'nearest' interpolation (round half away from zero), so thresholds agree with the old melt/group_by output.
+    """
+
+    return int(np.floor((n - 1) * quantile + 0.5))
+
+def row_thresholds(block, n_cols, quantile):
+
+    """
+    Computes the given quantile of every row of a sparse similarity block, counting its implicit zeros.
+
+    Args:
+        block (csr_matrix): A sparse block of similarity rows with non-negative scores.
+        n_cols (int): The full row length, i.e. the number of entries in the corpus.
+        quantile (float): The quantile to compute for each row.
+
+    Returns:
+        ndarray: One threshold per row of the block.
+
+    Explanation:
+        - Sorted ascending, a row starts with its n_cols - nnz implicit zeros followed by its stored values.
+        - If the quantile's position falls inside the zeros the threshold is 0, with no work at all.
+        - Otherwise it is found by a partial selection over that row's stored values only, so the
+          cost is O(nnz) and no dense or long-format copy of the block is made.
+    """
+
+    rank = quantile_rank(n_cols, quantile)
+    implicit_zeros = n_cols - np.diff(block.indptr)
+    thresholds = np.zeros(block.shape[0], dtype=block.dtype)
+
+    for row in np.flatnonzero(implicit_zeros <= rank):
+        position = rank - implicit_zeros[row]
+        values = block.data[block.indptr[row]:block.indptr[row + 1]]
+        thresholds[row] = np.partition(values, position)[position]
+
+    return thresholds
+
+def select_topk(block, k):
+
+    """
+    Picks the k largest scores of every row of a dense block using partial selection.
+
+    Args:
+        block (ndarray): A dense (rows x N) block of similarity scores.
+        k (int): The number of scores kept per row.
+
+    Returns:
+        tuple: (indices, scores) arrays of shape (rows, k), best match first. Equal scores are
+               ordered by column, lowest first, so the result never depends on partition order.
+
+    Explanation:
+        - np.partition finds each row's k-th largest score in linear time.
+        - Every score above it is kept; the remaining slots go to the scores equal to it, in
+          column order, counted with a cumulative sum rather than a sort.
+        - Only the k chosen scores per row are then ordered.
+    """
+
+    kth = -np.partition(-block, k - 1, axis=1)[:, k - 1]
+    greater = block > kth[:, None]
+    tied = block == kth[:, None]
+    needed = k - greater.sum(axis=1)
+
+    chosen = greater | (tied & (np.cumsum(tied, axis=1, dtype=np.int32) <= needed[:, None]))
+    columns = np.nonzero(chosen)[1].reshape(-1, k)
+    values = np.take_along_axis(block, columns, axis=1)
+
+    order = np.lexsort((columns, -values), axis=1)
+    return np.take_along_axis(columns, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+def select_topk_sparse(block, k):
+
+    """
+    Picks the k largest scores of every row of a sparse block, looking only at its stored scores.
+
+    Args:
+        block (csr_matrix): A sparse (rows x N) block of non-negative similarity scores.
+        k (int): The number of scores kept per row.
+
+    Returns:
+        tuple: (indices, scores) arrays of shape (rows, k), identical to select_topk(block.toarray(), k).
+
+    Explanation:
+        - The stored positive scores are ordered by row, score (descending) and column, and the
+          first k of each row are kept. The cost grows with nnz, not with rows x N.
+        - Rows with fewer than k positive scores are padded with their lowest zero-scored columns,
+          which are the columns the dense kernel picks for the tied zeros.
+    """
+
+    n_rows, n_cols = block.shape
+    rows = np.repeat(np.arange(n_rows), np.diff(block.indptr))
+    data = np.asarray(block.data)
+    columns = np.asarray(block.indices)
+
+    positive = data > 0
+    rows, data, columns = rows[positive], data[positive], columns[positive]
+    order = np.lexsort((columns, -data, rows))
+    rows, data, columns = rows[order], data[order], columns[order]
+
+    counts = np.bincount(rows, minlength=n_rows)
+    rank = np.arange(len(rows)) - (np.cumsum(counts) - counts)[rows]
+    keep = rank < k
+
+    indices = np.full((n_rows, k), -1, dtype=np.int64)
+    scores = np.zeros((n_rows, k), dtype=data.dtype)
+    indices[rows[keep], rank[keep]] = columns[keep]
+    scores[rows[keep], rank[keep]] = data[keep]
+
+    short = np.flatnonzero(counts < k)
+    if len(short):
+        needed = k - counts[short]
+        pool = np.arange(min(2 * k, n_cols))
+        free = ~(pool[None, :, None] == indices[short][:, None, :]).any(axis=2)
+        chosen = free & (np.cumsum(free, axis=1) <= needed[:, None])
+
+        offsets = np.arange(needed.sum()) - np.repeat(np.cumsum(needed) - needed, needed)
+        indices[np.repeat(short, needed), np.repeat(counts[short], needed) + offsets] = \
+            np.broadcast_to(pool, chosen.shape)[chosen]
+
+    return indices, scores
+
+def pin_self(block, indices, scores, positions):
+
+    """
+    Moves each entry itself to the front of its top k, followed by the k - 1 best other entries.
+
+    Args:
+        block (csr_matrix): The similarity block the top k were selected from.
+        indices (ndarray): The (rows, k) column positions picked by select_topk or select_topk_sparse.
+        scores (ndarray): The matching (rows, k) scores.
+        positions (ndarray): The column of each row's own entry.
+
+    Returns:
+        tuple: (indices, scores) arrays of shape (rows, k) with the entry itself in column 0.
+
+    Explanation:
+        - Dropping the entry from its own top k leaves at least its k - 1 best other entries,
+          whether or not it ranked itself first, so no second selection is needed.
+    """
+
+    others = np.argsort(indices == positions[:, None], axis=1, kind='stable')[:, :-1]
+    self_scores = np.asarray(block[np.arange(len(positions)), positions]).ravel()
+
+    return np.column_stack([positions, np.take_along_axis(indices, others, axis=1)]),\
+        np.column_stack([self_scores, np.take_along_axis(scores, others, axis=1)])
+
+def inverted_index(tfidf_matrix):
+
+    """
+    Builds the L2-normalised entry vectors of a TF-IDF matrix and the inverted index over them.
+
+    Args:
+        tfidf_matrix (csr_matrix): The sparse (entries x vocabulary) TF-IDF matrix.
+
+    Returns:
+        tuple: (matrix, postings) where matrix is the normalised (entries x vocabulary) CSR matrix and
+               postings its (vocabulary x entries) CSR transpose: one posting list of (entry, weight)
+               pairs per token.
+
+    Explanation:
+        - Multiplying a block of entries by postings walks only the posting lists of the tokens those
+          entries contain, accumulating a score for each entry found there. Pairs that share no token
+          are never touched, so for the tag facets the cost follows tag co-occurrence rather than N^2.
+    """
+
+    matrix = normalize(sparse.csr_matrix(tfidf_matrix), norm='l2')
+    return matrix, matrix.T.tocsr()
+
+def blocked_similarity(tfidf_matrix, block_size=512, rows=None):
+
+    """
+    Computes the cosine similarity of a TF-IDF matrix against itself one block of rows at a time.
+
+    Args:
+        tfidf_matrix (csr_matrix): The sparse (entries x vocabulary) TF-IDF matrix.
+        block_size (int, optional): The number of rows multiplied per block. Defaults to 512.
+        rows (ndarray, optional): Positions of the query rows to score against the whole corpus.
+                                  Defaults to None (every row).
+
+    Yields:
+        tuple: (start, stop, block) where block is a sparse (stop - start) x N matrix holding the
+               cosine similarity between query rows start:stop and every row of the corpus.
+
+    Explanation:
+        - The rows are L2-normalised once so a plain sparse product gives the cosine similarity.
+        - Each block is scored against the inverted index, so only pairs sharing a token are stored.
+        - Only one block of the N x N similarity matrix is ever held in memory.
+    """
+
+    matrix, postings = inverted_index(tfidf_matrix)
+
+    if rows is None:
+        rows = np.arange(matrix.shape[0])
+
+    for start in range(0, len(rows), block_size):
+        stop = min(start + block_size, len(rows))
+        yield start, stop, matrix[rows[start:stop]] @ postings
+
+def threshold_block(block, n_cols, quantile):
+
+    """
+    Drops, in place, every score of a sparse similarity block at or below its row's quantile (see row_thresholds).
+    """
+
+    thresholds = row_thresholds(block, n_cols, quantile)
+    block.data *= block.data > np.repeat(thresholds, np.diff(block.indptr))
+    block.eliminate_zeros()
+
+def thresholded_blocks(blocks, n, quantile=None):
+
+    """
+    Yields similarity blocks with every score at or below its row's quantile dropped.
+
+    Args:
+        blocks (iterable): (start, stop, block) tuples, from blocked_similarity or any engine yielding the same.
+        n (int): The full row length, i.e. the number of entries in the corpus.
+        quantile (float, optional): The per-entry quantile used as the threshold, with the row's unstored
+                                    scores counted as zeros. Defaults to None, in which case the blocks are
+                                    passed through untouched.
+
+    Yields:
+        tuple: (start, stop, block) as given.
+    """
+
+    for start, stop, block in blocks:
+        if quantile is not None:
+            threshold_block(block, n, quantile)
+
+        yield start, stop, block
+
+def save_csr(matrix, stem):
+
+    """
+    Saves the data, indices and indptr arrays of a CSR matrix as <stem>_data.npy, <stem>_indices.npy and <stem>_indptr.npy.
+    """
+
+    np.save(f"{stem}_data.npy", matrix.data)
+    np.save(f"{stem}_indices.npy", matrix.indices)
+    np.save(f"{stem}_indptr.npy", matrix.indptr)
+
+def load_csr(stem, shape):
+
+    """
+    Opens a CSR matrix written by save_csr over memory-mapped arrays, so pages are only read from disk
+    when they are used and are shared, read-only, by every process that opens the same files.
+    """
+
+    return sparse.csr_matrix((
+            np.load(f"{stem}_data.npy", mmap_mode='r'),
+            np.load(f"{stem}_indices.npy", mmap_mode='r'),
+            np.load(f"{stem}_indptr.npy", mmap_mode='r')),
+        shape=shape)
+
+def rank_block(block, k, positions=None, dense_fraction=0.05):
+
+    """
+    Returns the (rows, k) top indices and scores of one similarity block.
+
+    Blocks with fewer than dense_fraction of their cells stored (typical of the tag facets) are ranked
+    by select_topk_sparse; denser ones are densified and ranked by select_topk. Both give the same result.
+    When the column positions of the rows' own entries are given, each entry is pinned first by pin_self.
+    """
+
+    if block.nnz < dense_fraction * block.shape[0] * block.shape[1]:
+        indices, scores = select_topk_sparse(block, k)
+    else:
+        indices, scores = select_topk(block.toarray(), k)
+
+    if positions is not None:
+        indices, scores = pin_self(block, indices, scores, positions)
+
+    return indices, scores
+
+def rank_blocks(blocks, indices, scores, dense_fraction=0.05, positions=None):
+
+    """
+    Fills the (rows, k) indices and scores arrays with the top k of every row of the given blocks (see rank_block).
+    """
+
+    k = indices.shape[1]
+
+    for start, stop, block in blocks:
+        block_positions = None if positions is None else positions[start:stop]
+        indices[start:stop], scores[start:stop] = rank_block(block, k, block_positions, dense_fraction)
+
+def rank_neighbours(blocks, n, n_rows, k, quantile=None, positions=None):
+
+    """
+    Thresholds and ranks the similarity blocks of one engine, the path shared by topk_neighbours,
+    ann_neighbours and minhash_neighbours.
+
+    Args:
+        blocks (iterable): (start, stop, block) tuples covering n_rows query rows in order.
+        n (int): The number of entries in the corpus.
+        n_rows (int): The number of query rows.
+        k (int): The number of neighbours kept per row.
+        quantile (float, optional): The per-entry threshold quantile; see thresholded_blocks. Defaults to None.
+        positions (ndarray, optional): The column position of each query row's own entry, to pin it first
+                                       (see pin_self). Defaults to None.
+
+    Returns:
+        tuple: (indices, scores) arrays of shape (n_rows, k), as returned by topk_neighbours.
+    """
+
+    indices = np.empty((n_rows, k), dtype=np.int64)
+    scores = np.empty((n_rows, k), dtype=np.float32)
+    rank_blocks(thresholded_blocks(blocks, n, quantile), indices, scores, positions=positions)
+
+    return indices, scores
+
+worker_state = {}
+
+def init_worker(folder, n, n_terms, k, quantile, pin_self):
+
+    """
+    Opens the shared matrices written by parallel_rank in a worker process.
+    """
+
+    worker_state["matrix"] = load_csr(os.path.join(folder, "matrix"), (n, n_terms))
+    worker_state["postings"] = load_csr(os.path.join(folder, "postings"), (n_terms, n))
+    worker_state.update(n=n, k=k, quantile=quantile, pin_self=pin_self)
+
+def rank_rows(query_rows):
+
+    """
+    Scores, thresholds and ranks one block of query rows inside a worker process.
+    """
+
+    # Arrays unpickled from the pool's pipe are read-only, which scipy's fancy indexing rejects.
+    query_rows = np.array(query_rows)
+    block = worker_state["matrix"][query_rows] @ worker_state["postings"]
+
+    if worker_state["quantile"] is not None:
+        threshold_block(block, worker_state["n"], worker_state["quantile"])
+
+    return rank_block(block, worker_state["k"], query_rows if worker_state["pin_self"] else None)
+
+def parallel_rank(tfidf_matrix, rows, indices, scores, quantile=None, block_size=512, pin_self=False, workers=2):
+
+    """
+    Fills indices and scores like rank_blocks, farming the blocks of rows out to a pool of worker processes.
+
+    Args:
+        tfidf_matrix (csr_matrix): The sparse (entries x vocabulary) TF-IDF matrix.
+        rows (ndarray): Positions of the query rows, in the order of indices and scores.
+        indices (ndarray): A (len(rows), k) array receiving the neighbour positions.
+        scores (ndarray): A (len(rows), k) array receiving the neighbour scores.
+        quantile (float, optional): The per-entry threshold quantile. Defaults to None.
+        block_size (int, optional): The number of rows each task scores. Defaults to 512.
+        pin_self (bool, optional): Whether each entry is pinned first in its own list. Defaults to False.
+        workers (int, optional): The number of worker processes. Defaults to 2.
+
+    Explanation:
+        - The normalised matrix and its inverted index are saved once to a temporary folder. Every
+          worker memory-maps the same files read-only, so they share one copy through the OS page
+          cache instead of each receiving a pickled copy.
+        - Only the block's row positions go to a worker, and only its (block_size, k) result comes back.
+    """
+
+    matrix, postings = inverted_index(tfidf_matrix)
+    n, n_terms = matrix.shape
+    starts = range(0, len(rows), block_size)
+
+    with tempfile.TemporaryDirectory() as folder:
+        save_csr(matrix, os.path.join(folder, "matrix"))
+        save_csr(postings, os.path.join(folder, "postings"))
+        del matrix, postings
+
+        with multiprocessing.Pool(
+                workers, initializer=init_worker, initargs=(folder, n, n_terms, indices.shape[1], quantile, pin_self)) as pool:
+            chunks = pool.imap(rank_rows, [rows[start:start + block_size] for start in starts])
+            for start, (block_indices, block_scores) in zip(starts, chunks):
+                indices[start:start + block_size], scores[start:start + block_size] = block_indices, block_scores
+
+def topk_neighbours(tfidf_matrix, k=4, quantile=None, block_size=512, rows=None, pin_self=False, workers=1):
+
+    """
+    Finds each entry's k most similar entries without materialising the full similarity matrix.
+
+    Args:
+        tfidf_matrix (csr_matrix): The sparse (entries x vocabulary) TF-IDF matrix.
+        k (int, optional): The number of neighbours kept per entry. Defaults to 4.
+        quantile (float, optional): When given, scores at or below this per-entry quantile of the
+                                    similarity row are zeroed before ranking. Defaults to None.
+        block_size (int, optional): The number of rows scored per block. Defaults to 512.
+        rows (ndarray, optional): Positions of the entries to find neighbours for. Their neighbours are
+                                  still drawn from the whole corpus. Defaults to None (every entry).
+        pin_self (bool, optional): When True, each entry is placed first in its own list and followed by
+                                   its k - 1 best other entries. Defaults to False.
+        workers (int, optional): The number of processes the blocks are spread over; see parallel_rank.
+                                 Defaults to 1.
+
+    Returns:
+        tuple: (indices, scores) arrays of shape (len(rows), k). indices holds row positions, best match
+               first; ties are broken by the lower row position.
+
+    Explanation:
+        - Each block of similarity rows is thresholded while still sparse, then ranked and dropped.
+        - Peak memory is one block_size x N block plus the N x k result, instead of N x N.
+        - With several workers, blocks are scored and ranked concurrently by parallel_rank.
+    """
+
+    n = tfidf_matrix.shape[0]
+    n_rows = n if rows is None else len(rows)
+    k = min(k, n)
+
+    if workers > 1:
+        indices = np.empty((n_rows, k), dtype=np.int64)
+        scores = np.empty((n_rows, k), dtype=np.float32)
+        parallel_rank(tfidf_matrix, np.arange(n) if rows is None else np.asarray(rows), indices, scores,
+                      quantile=quantile, block_size=block_size, pin_self=pin_self, workers=workers)
+        return indices, scores
+
+    positions = None
+    if pin_self:
+        positions = np.arange(n) if rows is None else np.asarray(rows)
+
+    return rank_neighbours(blocked_similarity(tfidf_matrix, block_size, rows), n, n_rows, k, quantile, positions)
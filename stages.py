@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+
+def stage_keys(stages):
+
+    """
+    Fingerprints every stage of a dependency graph by its declared inputs and the stages it depends on.
+
+    Args:
+        stages (dict): Stage name -> a dict with 'inputs' (a list of JSON-serialisable values, such as column
+                       keys and settings), 'after' (the names of the stages it depends on) and 'outputs' (the
+                       files it writes). Every stage must come after the stages it depends on.
+
+    Returns:
+        dict: Stage name -> the hex SHA-1 of its inputs and of the keys of the stages it depends on.
+
+    Explanation:
+        - Each key includes the keys upstream of it, so a change to any input changes the key of every
+          stage downstream of it as well.
+    """
+
+    keys = {}
+    for name, stage in stages.items():
+        keys[name] = hashlib.sha1(json.dumps(
+            [name, stage["inputs"], [keys[upstream] for upstream in stage["after"]]],
+            sort_keys=True, default=str).encode()).hexdigest()
+
+    return keys
+
+def load_manifest(manifest_path):
+
+    """
+    Returns the stage keys saved by record_stage, or an empty dict if there are none.
+    """
+
+    if not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+def stale_stages(stages, keys, manifest, force=False):
+
+    """
+    Picks the stages that have to run.
+
+    Args:
+        stages (dict): The dependency graph, as passed to stage_keys.
+        keys (dict): The keys returned by stage_keys.
+        manifest (dict): The keys of the last completed runs, as returned by load_manifest.
+        force (bool, optional): When True, every stage is stale. Defaults to False.
+
+    Returns:
+        list: The names of the stages whose key differs from the one they last completed with, or whose
+              outputs are missing, in graph order.
+    """
+
+    return [
+        name for name, stage in stages.items()
+        if force or manifest.get(name) != keys[name] or not all(os.path.exists(path) for path in stage["outputs"])]
+
+def record_stage(manifest_path, manifest, name, key):
+
+    """
+    Marks a stage as completed with a key, updating the manifest in place and on disk.
+    """
+
+    manifest[name] = key
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
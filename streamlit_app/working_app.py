@@ -2,94 +2,89 @@ import pandas as pd
 import polars as pl
 import numpy as np
 import plotly.express as px
+import pyarrow as pa
+import pyarrow.ipc
 import os
 import streamlit as st
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
+# The cleaned transcripts, one per row of display.arrow, in an uncompressed Arrow IPC file written by pipeline.py.
+transcripts_path = "transcripts.arrow"
 
 
+# Maps each internal ID of a frame to its row position, so a lookup is a dict access instead of a filter.
+def row_index(df):
+    return {internal_id: row for row, internal_id in enumerate(df["internal_id"].to_list())}
+
+# Wraps an uncompressed Arrow IPC file in a DataFrame without copying it. The pages are read from disk when first
+# touched and shared through the page cache by every app process on the machine.
+def map_arrow(path):
+    table = pa.ipc\
+        .open_file(pa.memory_map(path))\
+        .read_all()
+
+    return pl.from_arrow(table)
+
+# The neighbour lists are converted from parquet to Arrow once, the first time the app sees a new parquet file.
+def map_neighbours(facet):
+    parquet_path = f"closest_{facet}_df.parquet"
+    arrow_path = f"closest_{facet}_df.arrow"
+
+    if not os.path.exists(arrow_path) or os.path.getmtime(arrow_path) < os.path.getmtime(parquet_path):
+        pl.read_parquet(parquet_path).write_ipc(f"{arrow_path}.{os.getpid()}", compression="uncompressed")
+        os.replace(f"{arrow_path}.{os.getpid()}", arrow_path)
+
+    return map_arrow(arrow_path)
+
 # Define the data
-@st.cache_data
+# st.cache_resource hands every session the same read-only objects instead of a deserialized copy each.
+@st.cache_resource
 def load_in_data():
-    people = pl.read_parquet("closest_people_df.parquet")
-    places = pl.read_parquet("closest_places_df.parquet")
-    topics = pl.read_parquet("closest_topics_df.parquet")
+    people = map_neighbours("people")
+    places = map_neighbours("places")
+    topics = map_neighbours("topics")
 
 
-    return people, places, topics
+    return people, places, topics, row_index(people), row_index(places), row_index(topics)
 
-@st.cache_data
+# display.arrow is written by pipeline.py with the tags already formatted for display, so no CSV is parsed here.
+@st.cache_resource
 def make_df_display():
-    df_display = pl\
-        .read_csv('derived_data.csv')\
-        .rename({
-            'Internal ID': 'internal_id',
-            'Document Type': 'document_type',
-            'Parent ID': 'parent_id',
-            'Order': 'order',
-            'Parent Name': 'parent_name',
-            'UUID': 'uuid',
-            'Name': 'name',
-            'Website URL': 'website_url',
-            'Short URL': 'short_url',
-            'Image URL': 'image_url',
-            'Original Transcript': 'original_transcript',
-            'Text Only Transcript': 'text_only_transcript',
-            'People': 'people',
-            'Places': 'places',
-            'First Date': 'first_date',
-            'Dates': 'dates',
-            'Topics': 'topics'})\
-        .select(['internal_id', 'text_only_transcript', 'people', 'places', 'topics'])\
-        .with_columns([
-            pl.col("people").fill_null(""),
-            pl.col("places").fill_null(""),
-            pl.col("topics").fill_null("")])\
-        .with_columns([
-            pl\
-                .col("text_only_transcript")\
-                .str\
-                .replace_all(r"\||\[\[|\]\]|\\r|\\t|\\n", " "),
-            pl\
-                .col("people")\
-                .str\
-                .replace_all(r"\||\[\[|\]\]|\\r|\\t|\\n", ", "),
-            pl\
-                .col("places")\
-                .str\
-                .replace_all(r"\||\[\[|\]\]|\\r|\\t|\\n", ", "),
-            pl\
-                .col("topics")\
-                .str\
-                .replace_all(r"\||\[\[|\]\]|\\r|\\t|\\n", ", ")])
-    
-    return df_display
+    df_display = map_arrow("display.arrow")
+
+    return df_display, row_index(df_display)
+
+# The transcripts are memory-mapped rather than loaded, so only the pages of the transcripts shown are ever read.
+@st.cache_resource
+def open_transcripts():
+    return map_arrow(transcripts_path)["text_only_transcript"]
 
-@st.cache_data
+@st.cache_resource
 def get_emotions():
     return pd.read_csv("emotions.csv")\
         .rename(columns={"Unnamed: 0": "emotions"})\
         .set_index("emotions")
 
 def grab_from_internal_id(internal_id, column_name):
-    return df_display\
-        .filter(pl.col("internal_id") == internal_id)\
-        [column_name]\
-        .to_list()[0]
+    return df_display.item(display_rows[internal_id], column_name)
+
+def grab_transcript(internal_id):
+    return transcripts[display_rows[internal_id]]
+
+def closest_match(df, rows, internal_id, rank):
+    return df.item(rows[internal_id], f"closest_{rank}")
 
 with st.status("Loading and calculating..."):
     st.write("Defining data...")
-    df_display = make_df_display()
-    people, places, topics = load_in_data()
+    df_display, display_rows = make_df_display()
+    transcripts = open_transcripts()
+    people, places, topics, people_rows, places_rows, topics_rows = load_in_data()
     emotions = get_emotions()
     st.write("Finished!")
 
 def return_text(df, match_number, column_name):
-    return df_display\
-        .filter(pl.col("internal_id") == match_number)\
-        .select([column_name])\
-        .item()
+    return grab_from_internal_id(match_number, column_name)
 
 def make_radarchart(id):
 
@@ -139,7 +134,7 @@ with side_col3:
     st.sidebar.write(f":green[{grab_from_internal_id(input_number, 'places')}]")
 
 st.sidebar.write("Transcript:")
-st.sidebar.write(grab_from_internal_id(input_number, "text_only_transcript"))
+st.sidebar.write(grab_transcript(input_number))
 
 
 # ######################
@@ -156,10 +151,7 @@ with tab1:
     st.header("People Match 1")
     ###
     
-    match1_people = people\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_1"])[0]\
-        .item()
+    match1_people = closest_match(people, people_rows, input_number, 1)
     
     st.write(f"Internal ID: {match1_people}")
 
@@ -177,19 +169,13 @@ with tab1:
         st.write("Places:")
         st.write(f":green[{return_text(people, match1_people, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match1_people)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match1_people))
 
     ###
 
     st.header("People Match 2")
 
-    match2_people = people\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_2"])[0]\
-        .item()
+    match2_people = closest_match(people, people_rows, input_number, 2)
     
     st.write(f"Internal ID: {match2_people}")
 
@@ -207,19 +193,13 @@ with tab1:
         st.write("Places:")
         st.write(f":green[{return_text(people, match2_people, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match2_people)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match2_people))
     
     ###
 
     st.header("People Match 3")
 
-    match3_people = people\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_3"])[0]\
-        .item()
+    match3_people = closest_match(people, people_rows, input_number, 3)
     
     st.write(f"Internal ID: {match3_people}")
 
@@ -237,10 +217,7 @@ with tab1:
         st.write("Places:")
         st.write(f":green[{return_text(people, match3_people, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match3_people)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match3_people))
 
 with tab2:
 
@@ -248,10 +225,7 @@ with tab2:
     st.header("Topics Match 1")
     ###
     
-    match1_topics = topics\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_1"])[0]\
-        .item()
+    match1_topics = closest_match(topics, topics_rows, input_number, 1)
     
     st.write(f"Internal ID: {match1_topics}")
 
@@ -269,19 +243,13 @@ with tab2:
         st.write("Places:")
         st.write(f":green[{return_text(topics, match1_topics, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match1_topics)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match1_topics))
 
     ###
 
     st.header("Topics Match 2")
 
-    match2_topics = topics\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_2"])[0]\
-        .item()
+    match2_topics = closest_match(topics, topics_rows, input_number, 2)
     
     st.write(f"Internal ID: {match2_topics}")
 
@@ -299,19 +267,13 @@ with tab2:
         st.write("Places:")
         st.write(f":green[{return_text(topics, match2_topics, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match2_topics)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match2_topics))
     
     ###
 
     st.header("Topics Match 3")
 
-    match3_topics = topics\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_3"])[0]\
-        .item()
+    match3_topics = closest_match(topics, topics_rows, input_number, 3)
     
     st.write(f"Internal ID: {match3_topics}")
 
@@ -329,10 +291,7 @@ with tab2:
         st.write("Places:")
         st.write(f":green[{return_text(topics, match3_topics, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match3_topics)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match3_topics))
 
 with tab3:
 
@@ -340,10 +299,7 @@ with tab3:
     st.header("Places Match 1")
     ###
     
-    match1_places = places\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_1"])[0]\
-        .item()
+    match1_places = closest_match(places, places_rows, input_number, 1)
     
     st.write(f"Internal ID: {match1_places}")
 
@@ -361,19 +317,13 @@ with tab3:
         st.write("Places:")
         st.write(f":green[{return_text(places, match1_places, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match1_places)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match1_places))
 
     ###
 
     st.header("Places Match 2")
 
-    match2_places = places\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_2"])[0]\
-        .item()
+    match2_places = closest_match(places, places_rows, input_number, 2)
     
     st.write(f"Internal ID: {match2_places}")
 
@@ -385,25 +335,19 @@ with tab3:
 
     with col2_tab1:
         st.write("People:")
-        st.write(f":red[{return_text([places], match2_places, 'people')}]")
+        st.write(f":red[{return_text(places, match2_places, 'people')}]")
 
     with col3_tab1:
         st.write("Places:")
         st.write(f":green[{return_text(places, match2_places, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match2_places)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match2_places))
     
     ###
 
     st.header("Places Match 3")
 
-    match3_places = places\
-        .filter(pl.col("internal_id") == input_number)\
-        .select(["closest_3"])[0]\
-        .item()
+    match3_places = closest_match(places, places_rows, input_number, 3)
     
     st.write(f"Internal ID: {match3_places}")
 
@@ -421,7 +365,4 @@ with tab3:
         st.write("Places:")
         st.write(f":green[{return_text(places, match3_places, 'places')}]")
 
-    st.write(df_display\
-        .filter(pl.col("internal_id") == match3_places)\
-        .select(["text_only_transcript"])[0]\
-        .item())
+    st.write(grab_transcript(match3_places))